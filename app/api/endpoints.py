@@ -1,39 +1,180 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, case
-from app.core.database import get_async_db
+from sqlalchemy import select, func, case, literal_column
+from app.core.cache import CacheEntry, response_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, features, get_db
+from app.core.metrics import STAGE_LATENCY, STATIONS_REFRESHED, record_timing, stage
 from app.models.station import Station
 from app.models.price import Price
-from app.services.fuel import FuelService
-from geopy.distance import geodesic
+from app.services.ingestion import demand_tracker
+from app.services.prices import PriceService
+from app.services.snapshot import station_snapshot
+from app.services.tokens import token_manager
+from app.services.spatial import station_index, bounding_box, haversine_many
 from loguru import logger
-from datetime import datetime, timedelta
+from datetime import datetime
 import asyncio
+import orjson
+import time
 
 router = APIRouter()
 
-tokens = {}
+STREAM_BATCH = 500
 
-def set_tokens(new_tokens):
-    global tokens
-    tokens = new_tokens
+BULK_MAX_STATIONS = 1000
+
+# Price refreshes still running after their search responded
+background_refreshes = set()
+
+def cache_key(path: str, **params):
+    return (path,) + tuple(sorted((k, v) for k, v in params.items() if v is not None))
+
+def json_response(request: Request, entry, media_type: str = "application/json"):
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(content=entry.body, media_type=media_type, headers={"ETag": entry.etag})
+
+def media_type_for(format: str) -> str:
+    return "application/x-ndjson" if format == "ndjson" else "application/json"
+
+async def encode_stream(items, format: str = "json"):
+    """Encode an async iterable of dicts as a JSON array or NDJSON, in chunks."""
+    ndjson = format == "ndjson"
+    if not ndjson:
+        yield b"["
+    batch = []
+    started = False
+    encoding = 0.0
+    async for item in items:
+        tick = time.perf_counter()
+        batch.append(orjson.dumps(item))
+        encoding += time.perf_counter() - tick
+        if len(batch) >= STREAM_BATCH:
+            yield b"".join(line + b"\n" for line in batch) if ndjson else (b"," if started else b"") + b",".join(batch)
+            started = True
+            batch = []
+    if batch:
+        yield b"".join(line + b"\n" for line in batch) if ndjson else (b"," if started else b"") + b",".join(batch)
+    if not ndjson:
+        yield b"]"
+    STAGE_LATENCY.labels("serialize").observe(encoding)
+    record_timing("serialize", encoding)
+
+def finish_background_refresh(task):
+    background_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background price refresh failed: {task.exception()}")
+
+async def cache_while_streaming(key, chunks, station_ids=(), cache: bool = True):
+    """Pass chunks through, caching the full body if it stays under CACHE_MAX_BODY."""
+    buffered = [] if settings.CACHE_ENABLED and cache else None
+    size = 0
+    async for chunk in chunks:
+        if buffered is not None:
+            size += len(chunk)
+            if size <= settings.CACHE_MAX_BODY:
+                buffered.append(chunk)
+            else:
+                buffered = None
+        yield chunk
+    if buffered is not None:
+        response_cache.set(key, b"".join(buffered), station_ids)
+
+async def station_rows(query):
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH))
+        async for row in result.mappings():
+            yield dict(row)
 
 @router.get("/stations")
-async def read_stations(skip: int = 0, limit: int = 5000, db: AsyncSession = Depends(get_async_db)):
-    result = await db.execute(select(Station).offset(skip).limit(limit))
-    stations = result.scalars().all()
-    return stations
+async def read_stations(request: Request, after: str = None, skip: int = 0, limit: int = 5000, format: str = "json"):
+    """List stations ordered by id; pass the last id of a page as `after` for the next one."""
+    key = cache_key("/stations", after=after, skip=skip, limit=limit, format=format)
+    entry = response_cache.get(key) if settings.CACHE_ENABLED else None
+    if entry is not None:
+        return json_response(request, entry, media_type_for(format))
+
+    query = select(*Station.__table__.columns).order_by(Station.id).limit(limit)
+    if after is not None:
+        query = query.filter(Station.id > after)
+    if skip:
+        query = query.offset(skip)
+    chunks = encode_stream(station_rows(query), format)
+    return StreamingResponse(cache_while_streaming(key, chunks), media_type=media_type_for(format))
+
+@router.get("/cache/stats")
+async def read_cache_stats():
+    return response_cache.stats()
 
 @router.get("/stations/{station_id}/prices")
-async def read_station_prices(station_id: str, db: AsyncSession = Depends(get_async_db)):
+async def read_station_prices(station_id: str, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Price).filter(Price.station_id == station_id))
     prices = result.scalars().all()
     if not prices:
         raise HTTPException(status_code=404, detail="Prices not found")
     return prices
 
+@router.get("/prices")
+async def read_prices(
+    request: Request,
+    station_ids: str,
+    tags: str = None,
+    since: str = None,
+    latest: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Prices for many stations in one response, e.g. a client's favorites.
+
+    Pass the returned `cursor` as `since` on the next call to receive only
+    prices stored after it. The cursor follows server write order, so reports
+    ingested late are not skipped. If-None-Match answers 304 when nothing changed.
+    """
+    ids = sorted(set(filter(None, station_ids.split(','))))
+    if not ids:
+        raise HTTPException(status_code=400, detail="station_ids is required")
+    if len(ids) > BULK_MAX_STATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_STATIONS} station_ids per request")
+    tag_list = sorted(set(tags.split(','))) if tags else None
+    position = None
+    if since:
+        try:
+            position = datetime.fromisoformat(since) if latest else int(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="since must be a cursor returned by this endpoint")
+
+    # Only full fetches are shared; per-client cursors would just churn the cache
+    cacheable = settings.CACHE_ENABLED and position is None
+    key = cache_key("/prices", station_ids=",".join(ids), tags=",".join(tag_list) if tag_list else None, latest=latest)
+    entry = response_cache.get(key) if cacheable else None
+    if entry is not None:
+        return json_response(request, entry)
+
+    with stage("prices"):
+        prices_by_station = await PriceService.load_prices(db, ids, latest=latest, tags=tag_list, since=position)
+
+    stations = {}
+    for station_id, prices in prices_by_station.items():
+        if not prices:
+            continue
+        stations[station_id] = [{"tag": price.tag, "value": price.price, "timestamp": price.updated} for price in prices]
+        written = [price.updated_at if latest else price.id for price in prices]
+        newest = max((value for value in written if value is not None), default=None)
+        if newest is not None and (position is None or newest > position):
+            position = newest
+
+    cursor = position.isoformat() if isinstance(position, datetime) else position
+    body = orjson.dumps({"cursor": None if cursor is None else str(cursor), "stations": stations})
+    if cacheable:
+        entry = response_cache.set(key, body, ids)
+    else:
+        entry = CacheEntry(body, ids, 0)
+    return json_response(request, entry)
+
 @router.get("/stations/search")
 async def search_stations(
+    request: Request,
     name: str = None,
     longitude: float = None,
     latitude: float = None,
@@ -44,146 +185,220 @@ async def search_stations(
     sortby: str = None,
     city: str = None,
     zipcode: str = None,
-    dbonly: bool = False,
+    nearest: int = None,
+    dbonly: bool = None,
     simplified: bool = False,
-    db: AsyncSession = Depends(get_async_db)
+    format: str = "json",
+    db: AsyncSession = Depends(get_db)
 ):
-    if not tokens or "accessToken" not in tokens:
-        raise HTTPException(status_code=401, detail="Access token missing or invalid")
-
-    query = select(Station)
-
-    if name:
-        names = name.split(',')
-        logger.info(f"Searching stations by names: {names}")
-        name_order = case(*[(Station.name.ilike(n), i) for i, n in enumerate(names)], else_=len(names))
-        query = query.filter(func.lower(Station.name).in_([n.lower() for n in names])).order_by(name_order)
-    if chain:
-        chains = chain.split(',')
-        logger.info(f"Searching stations by chain: {chains}")
-        query = query.filter(func.lower(Station.chain).in_([c.lower() for c in chains]))
-    if city:
-        logger.info(f"Searching stations by city: {city}")
-        query = query.filter(Station.address_city.ilike(f"%{city}%"))
-    if zipcode:
-        logger.info(f"Searching stations by zipcode: {zipcode}")
-        query = query.filter(Station.address_zipcode.ilike(f"%{zipcode}%"))
+    started = time.perf_counter()
+    if dbonly is None:
+        dbonly = settings.INGESTION_ENABLED
     if longitude is not None and latitude is not None:
-        logger.info(f"Searching stations by location: longitude={longitude}, latitude={latitude}")
-        result = await db.execute(query)
-        stations = result.scalars().all()
-        stations = [station for station in stations if geodesic((latitude, longitude), (station.location_latitude, station.location_longitude)).km <= distance / 1000]
-    else:
-        result = await db.execute(query)
-        stations = result.scalars().all()
+        longitude = round(longitude, settings.CACHE_COORD_PRECISION)
+        latitude = round(latitude, settings.CACHE_COORD_PRECISION)
+    key = cache_key(
+        "/stations/search",
+        name=name,
+        longitude=longitude,
+        latitude=latitude,
+        distance=distance,
+        latest=latest,
+        chain=",".join(sorted(c.lower() for c in chain.split(","))) if chain else None,
+        fuel_type=",".join(sorted(fuel_type.split(","))) if fuel_type else None,
+        sortby=sortby,
+        city=city.lower() if city else None,
+        zipcode=zipcode,
+        nearest=nearest,
+        dbonly=dbonly,
+        simplified=simplified,
+        format=format
+    )
+    entry = response_cache.get(key) if settings.CACHE_ENABLED else None
+    if entry is not None:
+        # Repeated searches still count towards ingestion priority
+        demand_tracker.record(entry.station_ids)
+        return json_response(request, entry, media_type_for(format))
+
+    with stage("stations"):
+        nearby = {}
+        query = select(*Station.__table__.columns)
+
+        if name:
+            names = name.split(',')
+            name_order = case(*[(Station.name.ilike(n), i) for i, n in enumerate(names)], else_=len(names))
+            query = query.filter(func.lower(Station.name).in_([n.lower() for n in names])).order_by(name_order)
+        if chain:
+            chains = chain.split(',')
+            query = query.filter(func.lower(Station.chain).in_([c.lower() for c in chains]))
+        if city:
+            query = query.filter(Station.address_city.ilike(f"%{city}%"))
+        if zipcode:
+            query = query.filter(Station.address_zipcode.ilike(f"%{zipcode}%"))
+        if longitude is not None and latitude is not None and features.postgis:
+            # ST_DWithin on the geography column is answered from its GiST index
+            location = literal_column("stations.location")
+            origin = func.geography(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326))
+            station_distance = func.ST_Distance(location, origin)
+            query = query.add_columns(station_distance.label("distance")).filter(func.ST_DWithin(location, origin, distance))
+            if nearest:
+                query = query.order_by(station_distance).limit(nearest)
+            result = await db.execute(query)
+            stations = result.all()
+            nearby = {station.id: station.distance for station in stations}
+        elif longitude is not None and latitude is not None:
+            min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance)
+            query = query.filter(
+                Station.location_latitude.between(min_lat, max_lat),
+                Station.location_longitude.between(min_lon, max_lon)
+            )
+            # Query the shared mapped grid when there is one, else this worker's own index
+            station_snapshot.refresh()
+            spatial = station_snapshot if station_snapshot.ready else station_index
+            if spatial.ready and nearest and not (name or chain or city or zipcode):
+                nearby = dict(spatial.nearest(latitude, longitude, nearest, max_distance=distance))
+                query = query.filter(Station.id.in_(list(nearby)))
+            elif spatial.ready:
+                nearby = spatial.within(latitude, longitude, distance)
+                if len(nearby) <= settings.SNAPSHOT_MAX_CANDIDATES:
+                    query = query.filter(Station.id.in_(list(nearby)))
+            result = await db.execute(query)
+            stations = result.all()
+            if not spatial.ready:
+                distances = haversine_many(latitude, longitude, [(s.location_latitude, s.location_longitude) for s in stations])
+                nearby = {station.id: d for station, d in zip(stations, distances) if d <= distance}
+            stations = [station for station in stations if station.id in nearby]
+        else:
+            result = await db.execute(query)
+            stations = result.all()
+        if nearest and longitude is not None and latitude is not None:
+            stations = sorted(stations, key=lambda s: nearby[s.id])[:nearest]
 
     if not stations:
         raise HTTPException(status_code=404, detail="Stations not found")
 
-    async def fetch_prices_for_station(station):
-        try:
-            prices_query = select(Price).filter(Price.station_id == station.id)
-            if latest:
-                subquery = prices_query.order_by(desc(Price.updated_at)).distinct(Price.tag).with_entities(Price.id).subquery()
-                result = await db.execute(select(Price).filter(Price.station_id == station.id, Price.id.in_(subquery)))
-                prices = result.scalars().all()
-            else:
-                result = await db.execute(prices_query)
-                prices = result.scalars().all()
+    station_ids = [station.id for station in stations]
+    demand_tracker.record(station_ids)
+    fuel_types = fuel_type.split(',') if fuel_type else None
 
-            should_update = True
-            if dbonly:
-                should_update = False
-            else:
-                if prices:
-                    last_updated = max(price.updated_at for price in prices)
-                    if last_updated and datetime.utcnow() - last_updated < timedelta(minutes=20):
-                        should_update = False
-
-            if should_update:
-                logger.info(f"Fetching prices from API for station {station.id}")
-                prices_response = await FuelService.get_station_prices(station.id, tokens["accessToken"], since="2024-06-01T00:00:00Z")
-                for price_data in prices_response:
-                    for price in price_data.get("prices", []):
-                        price_record = Price(
-                            station_id=station.id,
-                            tag=price.get("tag"),
-                            price=price.get("value"),
-                            updated=price_data.get("timestamp"),
-                            delta=0,
-                            reporter=price_data.get("userId"),
-                            updated_at=datetime.utcnow()
-                        )
-                        db.add(price_record)
-                await db.commit()
-
-                result = await db.execute(prices_query)
-                prices = result.scalars().all()
-
-            prices_list = [
-                {
-                    "tag": price.tag,
-                    "value": price.price,
-                    "timestamp": price.updated
-                } for price in prices
-            ]
-
-            if fuel_type:
-                fuel_types = fuel_type.split(',')
-                prices_list = [price for price in prices_list if price["tag"] in fuel_types]
+    stale_ids = []
+    if not dbonly:
+        now = datetime.utcnow()
+        checked_at = await PriceService.load_checked_at(db, station_ids)
+        stale_ids = [station_id for station_id in station_ids if PriceService.is_stale(checked_at.get(station_id), now)]
+
+    stale = set()
+    refresh_ids = stale_ids
+    if stale_ids and not token_manager.fresh():
+        # Never block a search on login or refresh; renew in the background
+        token_manager.renew_in_background()
+        if not token_manager.access_token:
+            stale, refresh_ids = set(stale_ids), []
+
+    STATIONS_REFRESHED.observe(len(refresh_ids))
+    if refresh_ids:
+        # Stale-while-revalidate: wait at most SEARCH_REFRESH_BUDGET for upstream, then answer
+        # from the database and let the remaining refreshes finish in the background.
+        with stage("refresh"):
+            tasks = {asyncio.ensure_future(PriceService.refresh(station_id)): station_id for station_id in refresh_ids}
+            done, pending = await asyncio.wait(tasks, timeout=settings.SEARCH_REFRESH_BUDGET)
+            failures = [(tasks[task], task.exception()) for task in done if task.exception() is not None]
+            if failures:
+                logger.error(f"Failed to get prices for {len(failures)} stations, first {failures[0][0]}: {failures[0][1]}")
+            for task in pending:
+                background_refreshes.add(task)
+                task.add_done_callback(finish_background_refresh)
+            stale = {tasks[task] for task in pending} | {station_id for station_id, _ in failures}
 
+    # Price sorts need every station's prices up front; otherwise they are loaded while streaming
+    prices_by_station = None
+    if sortby in ("pricedesc", "priceasc", "newest"):
+        with stage("prices"):
+            prices_by_station = await PriceService.load_prices(db, station_ids, latest=latest, tags=fuel_types)
             if latest:
-                latest_prices_dict = {}
-                for price in prices_list:
-                    if price["tag"] not in latest_prices_dict or price["timestamp"] > latest_prices_dict[price["tag"]]["timestamp"]:
-                        latest_prices_dict[price["tag"]] = price
-                prices_list = list(latest_prices_dict.values())
-
-            if simplified:
-                enriched_station = {
-                    "name": station.name,
-                    "brand": station.brand,
-                    "location": {
-                        "latitude": station.location_latitude,
-                        "longitude": station.location_longitude
-                    },
-                    "prices": prices_list
-                }
+                latest_by_station = prices_by_station
             else:
-                enriched_station = {
-                    "id": station.id,
-                    "name": station.name,
-                    "chain": station.chain,
-                    "brand": station.brand,
-                    "address": {
-                        "street": station.address_street,
-                        "city": station.address_city,
-                        "zipcode": station.address_zipcode,
-                        "country": station.address_country
-                    },
-                    "location": {
-                        "latitude": station.location_latitude,
-                        "longitude": station.location_longitude
-                    },
-                    "is_visible": station.is_visible,
-                    "prices": prices_list
-                }
-            return enriched_station
-        except Exception as e:
-            logger.error(f"Failed to get prices for station {station.id}: {e}")
-            return None
-
-    tasks = [fetch_prices_for_station(station) for station in stations]
-    enriched_stations = await asyncio.gather(*tasks)
-
-    enriched_stations = [station for station in enriched_stations if station is not None]
-
-    if sortby:
-        if sortby == "pricedesc":
-            enriched_stations.sort(key=lambda x: min([price["value"] for price in x["prices"]]) if x["prices"] else float('inf'), reverse=True)
-        elif sortby == "priceasc":
-            enriched_stations.sort(key=lambda x: min([price["value"] for price in x["prices"]]) if x["prices"] else float('inf'))
-        elif sortby == "newest":
-            enriched_stations.sort(key=lambda x: max([price["timestamp"] for price in x["prices"]]) if x["prices"] else '', reverse=True)
-
-    return enriched_stations
+                latest_by_station = await PriceService.load_prices(db, station_ids, latest=True, tags=fuel_types)
+            if sortby == "newest":
+                stations = sorted(
+                    stations,
+                    key=lambda s: max([price.updated for price in latest_by_station[s.id]]) if latest_by_station[s.id] else '',
+                    reverse=True
+                )
+            else:
+                stations = sorted(
+                    stations,
+                    key=lambda s: min([price.price for price in latest_by_station[s.id]]) if latest_by_station[s.id] else float('inf'),
+                    reverse=sortby == "pricedesc"
+                )
+
+    def enrich_station(station, prices):
+        prices_list = [
+            {
+                "tag": price.tag,
+                "value": price.price,
+                "timestamp": price.updated
+            } for price in prices
+        ]
+
+        if simplified:
+            return {
+                "name": station.name,
+                "brand": station.brand,
+                "location": {
+                    "latitude": station.location_latitude,
+                    "longitude": station.location_longitude
+                },
+                "prices": prices_list
+            }
+        return {
+            "id": station.id,
+            "name": station.name,
+            "chain": station.chain,
+            "brand": station.brand,
+            "address": {
+                "street": station.address_street,
+                "city": station.address_city,
+                "zipcode": station.address_zipcode,
+                "country": station.address_country
+            },
+            "location": {
+                "latitude": station.location_latitude,
+                "longitude": station.location_longitude
+            },
+            "is_visible": station.is_visible,
+            "prices": prices_list
+        }
+
+    filters = {k: v for k, v in key[1:] if k not in ("dbonly", "format", "simplified", "latest")}
+    logger.info(
+        f"Search {filters}: {len(stations)} stations, {len(stale_ids)} stale, "
+        f"{len(stale_ids) - len(stale)} refreshed, {len(stale)} served stale in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+
+    async def enriched_stations():
+        loading = 0.0
+        # The request session may already be closed once streaming starts
+        async with AsyncSessionLocal() as prices_db:
+            for start in range(0, len(stations), STREAM_BATCH):
+                batch = stations[start:start + STREAM_BATCH]
+                prices = prices_by_station
+                if prices is None:
+                    tick = time.perf_counter()
+                    prices = await PriceService.load_prices(prices_db, [station.id for station in batch], latest=latest, tags=fuel_types)
+                    loading += time.perf_counter() - tick
+                for station in batch:
+                    item = enrich_station(station, prices[station.id])
+                    if station.id in stale:
+                        item["stale"] = True
+                    yield item
+        if prices_by_station is None:
+            STAGE_LATENCY.labels("prices").observe(loading)
+            record_timing("prices", loading)
+
+    # Responses with stale prices are not cached, so the background refresh shows up on the next request
+    chunks = encode_stream(enriched_stations(), format)
+    return StreamingResponse(
+        cache_while_streaming(key, chunks, station_ids, cache=not stale),
+        media_type=media_type_for(format)
+    )
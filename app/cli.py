@@ -0,0 +1,63 @@
+"""Maintenance commands.
+
+    python -m app.cli retention --days 90 --vacuum incremental
+"""
+import argparse
+import asyncio
+import json
+from app.core.config import settings
+from app.core.database import Base, engine
+from app.core.locks import FileLease
+from app.core.migrations import run_migrations, tables_exist
+import app.models.daily_price, app.models.demand, app.models.latest_price, app.models.maintenance_run  # noqa: F401
+import app.models.price, app.models.price_cursor, app.models.reporter, app.models.station, app.models.user  # noqa: F401
+from app.services.retention import RetentionService
+
+
+async def ensure_schema():
+    """Create and migrate the schema on a fresh database, under the same lease the app uses."""
+    lease = FileLease("schema")
+    while True:
+        async with engine.connect() as conn:
+            if await conn.run_sync(tables_exist):
+                return
+        if lease.acquire():
+            try:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    await conn.run_sync(run_migrations)
+            finally:
+                lease.release()
+            return
+        await lease.wait_released(settings.LOCK_WAIT_TIMEOUT)
+
+
+async def retention(args):
+    await ensure_schema()
+    try:
+        report = await RetentionService.run(days=args.days, vacuum=args.vacuum, batch_size=args.batch_size)
+    finally:
+        await engine.dispose()
+    if report is None:
+        print("Price retention is already running in another process")
+        return 1
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    retention_parser = commands.add_parser("retention", help="downsample old price history into daily_prices")
+    retention_parser.add_argument("--days", type=int, help="days of raw history to keep (default RETENTION_DAYS)")
+    retention_parser.add_argument("--vacuum", choices=["incremental", "full", "none"], help="default RETENTION_VACUUM")
+    retention_parser.add_argument("--batch-size", type=int, help="rows per delete batch (default RETENTION_BATCH_SIZE)")
+    retention_parser.set_defaults(handler=retention)
+
+    args = parser.parse_args()
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
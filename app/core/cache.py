@@ -0,0 +1,93 @@
+import hashlib
+import time
+from collections import OrderedDict
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "station_ids", "expires_at")
+
+    def __init__(self, body: bytes, station_ids, expires_at: float):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.station_ids = frozenset(station_ids)
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Bounded LRU cache of serialized responses with a TTL per entry.
+
+    Entries remember which stations they contain so price writes can drop
+    exactly the responses they affect.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.keys_by_station = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            CACHE_REQUESTS.labels("miss").inc()
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        CACHE_REQUESTS.labels("hit").inc()
+        return entry
+
+    def set(self, key, body: bytes, station_ids=()):
+        if key in self.entries:
+            self._remove(key)
+        entry = CacheEntry(body, station_ids, time.monotonic() + self.ttl)
+        self.entries[key] = entry
+        for station_id in entry.station_ids:
+            self.keys_by_station.setdefault(station_id, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for station_id in entry.station_ids:
+            keys = self.keys_by_station.get(station_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_station[station_id]
+
+    def invalidate_stations(self, station_ids):
+        for station_id in station_ids:
+            for key in list(self.keys_by_station.get(station_id, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self.entries)
+        self.entries.clear()
+        self.keys_by_station.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+response_cache = ResponseCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL)
@@ -7,9 +7,69 @@ class Settings:
     PROJECT_NAME: str = "TankRest"
     PROJECT_VERSION: str = "1.0.0"
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./data/fuel_prices.db")
+    DATABASE_ECHO: bool = os.getenv("DATABASE_ECHO", "false").lower() == "true"
+    DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+    DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+    DATABASE_POOL_RECYCLE: int = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+    DATABASE_POOL_TIMEOUT: float = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+    POSTGIS_ENABLED: bool = os.getenv("POSTGIS_ENABLED", "true").lower() == "true"
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_BUSY_TIMEOUT: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+    SQLITE_AUTO_VACUUM: str = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")
     EMAIL: str = os.getenv("EMAIL")
     PASSWORD: str = os.getenv("PASSWORD")
     DEVICE: str = os.getenv("DEVICE")
     USER_AGENT: str = os.getenv("USER_AGENT")
+    TANKILLE_API_URL: str = os.getenv("TANKILLE_API_URL", "https://api.tankille.fi")
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "100"))
+    HTTP_POOL_SIZE_PER_HOST: int = int(os.getenv("HTTP_POOL_SIZE_PER_HOST", "20"))
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+    UPSTREAM_CONCURRENCY: int = int(os.getenv("UPSTREAM_CONCURRENCY", "10"))
+    UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+    UPSTREAM_CONNECT_TIMEOUT: float = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+    UPSTREAM_STATIONS_TIMEOUT: float = float(os.getenv("UPSTREAM_STATIONS_TIMEOUT", "60"))
+    UPSTREAM_RETRIES: int = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_RETRY_BASE_DELAY: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.2"))
+    UPSTREAM_RETRY_MAX_DELAY: float = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2"))
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+    SEARCH_REFRESH_BUDGET: float = float(os.getenv("SEARCH_REFRESH_BUDGET", "0"))
+    PRICE_SINCE_DEFAULT: str = os.getenv("PRICE_SINCE_DEFAULT", "2024-06-01T00:00:00Z")
+    PRICE_MAX_AGE_MINUTES: int = int(os.getenv("PRICE_MAX_AGE_MINUTES", "20"))
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+    CACHE_TTL: float = float(os.getenv("CACHE_TTL", "60"))
+    CACHE_MAX_BODY: int = int(os.getenv("CACHE_MAX_BODY", str(4 * 1024 * 1024)))
+    CACHE_COORD_PRECISION: int = int(os.getenv("CACHE_COORD_PRECISION", "3"))
+    CACHE_INVALIDATION_INTERVAL: float = float(os.getenv("CACHE_INVALIDATION_INTERVAL", "5"))
+    SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", "./data/stations.snapshot")
+    SNAPSHOT_MAX_CANDIDATES: int = int(os.getenv("SNAPSHOT_MAX_CANDIDATES", "2000"))
+    STATION_SYNC_MIN_RATIO: float = float(os.getenv("STATION_SYNC_MIN_RATIO", "0.5"))
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")
+    LOG_JSON: bool = os.getenv("LOG_JSON", "false").lower() == "true"
+    LOG_FILE: str = os.getenv("LOG_FILE", "app.log")
+    LOG_ROTATION: str = os.getenv("LOG_ROTATION", "500 MB")
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+    SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "false").lower() == "true"
+    TOKEN_REFRESH_MARGIN: int = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+    TOKEN_DEFAULT_TTL: int = int(os.getenv("TOKEN_DEFAULT_TTL", "3600"))
+    TOKEN_RETRY_INTERVAL: int = int(os.getenv("TOKEN_RETRY_INTERVAL", "60"))
+    LOCK_DIR: str = os.getenv("LOCK_DIR", "/tmp/tankrest-locks")
+    INGESTION_ENABLED: bool = os.getenv("INGESTION_ENABLED", "true").lower() == "true"
+    INGESTION_INTERVAL: int = int(os.getenv("INGESTION_INTERVAL", "60"))
+    INGESTION_RATE: float = float(os.getenv("INGESTION_RATE", "2"))
+    DEMAND_FLUSH_INTERVAL: int = int(os.getenv("DEMAND_FLUSH_INTERVAL", "30"))
+    DEMAND_DECAY: float = float(os.getenv("DEMAND_DECAY", "0.9"))
+    LOCK_WAIT_TIMEOUT: float = float(os.getenv("LOCK_WAIT_TIMEOUT", "30"))
+    RETENTION_ENABLED: bool = os.getenv("RETENTION_ENABLED", "true").lower() == "true"
+    RETENTION_DAYS: int = int(os.getenv("RETENTION_DAYS", "90"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "2000"))
+    RETENTION_INTERVAL: int = int(os.getenv("RETENTION_INTERVAL", str(24 * 3600)))
+    RETENTION_VACUUM: str = os.getenv("RETENTION_VACUUM", "incremental").lower()
 
 settings = Settings()
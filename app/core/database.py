@@ -1,10 +1,74 @@
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.metrics import DB_QUERY_LATENCY, record_timing
 from contextlib import asynccontextmanager
+import time
 
-engine = create_async_engine(settings.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://"), echo=True)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str) -> str:
+    """Map a plain sqlite:// or postgresql:// URL onto its async driver."""
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+
+def engine_options(url: str):
+    options = {"echo": settings.DATABASE_ECHO}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+    return options
+
+
+engine = create_async_engine(async_url(settings.DATABASE_URL), **engine_options(settings.DATABASE_URL))
+
+SQLITE_PRAGMAS = {
+    # Only takes effect on a new database file or at the next full VACUUM
+    "auto_vacuum": settings.SQLITE_AUTO_VACUUM,
+    "journal_mode": settings.SQLITE_JOURNAL_MODE,
+    "synchronous": settings.SQLITE_SYNCHRONOUS,
+    "mmap_size": settings.SQLITE_MMAP_SIZE,
+    "cache_size": settings.SQLITE_CACHE_SIZE,
+    "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+    "temp_store": "MEMORY",
+}
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, so a failed statement leaves nothing behind
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def record_query_time(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    elapsed = time.perf_counter() - context._query_start
+    statement_type = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    DB_QUERY_LATENCY.labels(statement_type).observe(elapsed)
+    record_timing("db", elapsed)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -14,6 +78,11 @@ AsyncSessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+async def get_db():
+    """FastAPI dependency yielding a session that is closed after the response."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
 @asynccontextmanager
 async def get_async_db():
     async with AsyncSessionLocal() as session:
@@ -21,3 +90,25 @@ async def get_async_db():
             yield session
         finally:
             await session.close()
+
+class Features:
+    """Optional database capabilities, detected once the schema is migrated."""
+    postgis = False
+
+
+features = Features()
+
+
+def detect_features(conn):
+    features.postgis = settings.POSTGIS_ENABLED and conn.dialect.name == "postgresql" and conn.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'stations' AND column_name = 'location'"
+    )).first() is not None
+
+
+def upsert(model):
+    """INSERT for `model` supporting on_conflict_do_update/on_conflict_do_nothing."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import aiohttp
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_LATENCY, record_timing
+from app.core.resilience import CircuitBreaker
+
+
+class HttpClient:
+    """Application-lifetime aiohttp session shared by the upstream services."""
+
+    def __init__(self):
+        self.session = None
+        self.semaphore = None
+        self.breakers = {}
+        self.timeouts = {"stations": settings.UPSTREAM_STATIONS_TIMEOUT}
+
+    async def start(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_SIZE,
+                limit_per_host=settings.HTTP_POOL_SIZE_PER_HOST,
+                ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+            self.semaphore = asyncio.Semaphore(settings.UPSTREAM_CONCURRENCY)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(endpoint, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT)
+            self.breakers[endpoint] = breaker
+        return breaker
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, endpoint: str = "other", **kwargs):
+        """Send one request with a per-endpoint timeout, behind that endpoint's circuit breaker."""
+        breaker = self.breaker(endpoint)
+        breaker.before_call()
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(
+            total=self.timeouts.get(endpoint, settings.UPSTREAM_TIMEOUT),
+            connect=settings.UPSTREAM_CONNECT_TIMEOUT
+        ))
+        session = await self.start()
+        async with self.semaphore:
+            started = time.perf_counter()
+            status = "error"
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    status = str(response.status)
+                    yield response
+            finally:
+                elapsed = time.perf_counter() - started
+                UPSTREAM_LATENCY.labels(endpoint, status).observe(elapsed)
+                record_timing("upstream", elapsed)
+                if status == "error" or status == "429" or status.startswith("5"):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+
+    def breaker_states(self):
+        return {endpoint: breaker.state for endpoint, breaker in self.breakers.items()}
+
+
+http_client = HttpClient()
@@ -0,0 +1,55 @@
+import asyncio
+import fcntl
+import os
+from pathlib import Path
+from app.core.config import settings
+
+
+class FileLease:
+    """Non-blocking cross-process lock backed by flock on a file in LOCK_DIR.
+
+    The kernel drops the lock when the holding process exits, so a crashed
+    worker never leaves a stale lease behind.
+    """
+
+    def __init__(self, name: str):
+        self.path = Path(settings.LOCK_DIR) / f"{name}.lock"
+        self.fd = None
+
+    def acquire(self) -> bool:
+        if self.fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    async def wait_released(self, timeout: float, interval: float = 0.1) -> bool:
+        """Wait until no other process holds the lease, without taking it."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            if self.acquire():
+                self.release()
+                return True
+            await asyncio.sleep(interval)
+        return False
+
+
+leader_lease = FileLease("leader")
+
+
+def is_leader() -> bool:
+    """Become or remain the leader worker; safe to call repeatedly."""
+    return leader_lease.acquire()
@@ -0,0 +1,58 @@
+import random
+import re
+import sys
+from loguru import logger
+from app.core.config import settings
+
+SECRET_PATTERNS = [
+    # JWTs such as access and refresh tokens
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+"), "<redacted-jwt>"),
+    # 'accessToken': '...', "password": "...", token=... in dict reprs, JSON and query strings
+    (re.compile(r"""(['"]?(?:access_?token|refresh_?token|token|password)['"]?\s*[:=]\s*)(?:'[^']*'|"[^"]*"|[^'",\s}&]+)""", re.IGNORECASE), r"\1'<redacted>'"),
+]
+
+
+def redact(message: str) -> str:
+    for pattern, replacement in SECRET_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+def redact_record(record):
+    record["message"] = redact(record["message"])
+
+
+def parse_levels(spec: str):
+    """Parse "app.services.fuel=WARNING,app.api=DEBUG" into a loguru level filter."""
+    levels = {"": settings.LOG_LEVEL}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        module, _, level = item.partition("=")
+        levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def sampled() -> bool:
+    """Whether to emit a per-station message, at LOG_SAMPLE_RATE."""
+    rate = settings.LOG_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def configure_logging():
+    """Replace loguru's default sink with queued, optionally JSON, sinks.
+
+    enqueue=True hands records to a background writer thread, so logging
+    never blocks the event loop on terminal or file I/O.
+    """
+    levels = parse_levels(settings.LOG_LEVELS)
+    logger.remove()
+    logger.configure(patcher=redact_record)
+    logger.add(sys.stderr, level=0, filter=levels, enqueue=True, serialize=settings.LOG_JSON)
+    if settings.LOG_FILE:
+        logger.add(
+            settings.LOG_FILE,
+            level=0,
+            filter=levels,
+            enqueue=True,
+            serialize=settings.LOG_JSON,
+            rotation=settings.LOG_ROTATION
+        )
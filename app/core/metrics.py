@@ -0,0 +1,124 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from app.core.config import settings
+
+REQUEST_LATENCY = Histogram(
+    "tankrest_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+STAGE_LATENCY = Histogram(
+    "tankrest_stage_seconds", "Time spent in each request pipeline stage", ["stage"]
+)
+DB_QUERY_LATENCY = Histogram(
+    "tankrest_db_query_seconds", "Database statement latency", ["statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+UPSTREAM_LATENCY = Histogram(
+    "tankrest_upstream_seconds", "Upstream API call latency", ["endpoint", "status"]
+)
+STATIONS_REFRESHED = Histogram(
+    "tankrest_stations_refreshed_per_request", "Stations refreshed from upstream per search",
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+CACHE_REQUESTS = Counter(
+    "tankrest_cache_requests_total", "Response cache lookups", ["result"]
+)
+UPSTREAM_RETRIES = Counter(
+    "tankrest_upstream_retries_total", "Upstream calls retried after a transient failure", ["endpoint"]
+)
+UPSTREAM_CIRCUIT_OPENED = Counter(
+    "tankrest_upstream_circuit_opened_total", "Times an upstream endpoint's circuit breaker opened", ["endpoint"]
+)
+TOKEN_REFRESHES = Counter(
+    "tankrest_token_refresh_total", "Token login/refresh attempts", ["outcome"]
+)
+
+# Stage durations of the current request, reported in the Server-Timing header
+request_timings: ContextVar = ContextVar("request_timings", default=None)
+
+
+def record_timing(name: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.labels(name).observe(elapsed)
+        record_timing(name, elapsed)
+
+
+def server_timing_header(timings) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware timing each request until its last body chunk is sent.
+
+    Streaming endpoints query and serialize after returning their response,
+    so the timer has to wait for the final http.response.body message. With
+    SERVER_TIMING on, the response is buffered so its header can report every
+    stage; leave it off in production.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = {}
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        start_message = None
+        body = []
+
+        async def send_with_timing(message):
+            nonlocal status, start_message
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING:
+                    start_message = message
+                    return
+            elif message["type"] == "http.response.body" and start_message is not None:
+                body.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                timings["total"] = time.perf_counter() - started
+                headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() != b"content-length"]
+                content = b"".join(body)
+                headers.append((b"content-length", str(len(content)).encode()))
+                headers.append((b"server-timing", server_timing_header(timings).encode()))
+                await send({**start_message, "headers": headers})
+                await send({"type": "http.response.body", "body": content})
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(scope["method"], getattr(route, "path", "unmatched"), str(status)).observe(
+                time.perf_counter() - started
+            )
+            request_timings.reset(token)
+
+
+def render():
+    """Return (body, content type) for /metrics, aggregating Gunicorn workers when multiprocess mode is on."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,92 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from loguru import logger
+from app.core.config import settings
+from app.core.database import Base
+
+
+def dedupe_prices(conn):
+    """Drop duplicate price observations so the unique index can be built."""
+    indexes = {index["name"] for index in inspect(conn).get_indexes("prices")}
+    if "ux_prices_station_tag_updated" in indexes:
+        return
+    result = conn.execute(text(
+        "DELETE FROM prices WHERE id NOT IN "
+        "(SELECT MIN(id) FROM prices GROUP BY station_id, tag, updated)"
+    ))
+    logger.info(f"Removed {result.rowcount} duplicate price rows")
+
+
+def create_missing_indexes(conn):
+    """create_all only builds indexes for new tables; add the rest here.
+
+    Reflection skips expression indexes on SQLite, so checkfirst cannot be
+    trusted; let the database skip existing ones instead.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def drop_unused_indexes(conn):
+    """ix_prices_updated_at served change polling before it moved to latest_prices;
+    the city and zipcode indexes cannot serve the substring ILIKE search."""
+    for index in ("ix_prices_updated_at", "ix_stations_city_lower", "ix_stations_zipcode"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+
+def backfill_latest_prices(conn):
+    """Populate latest_prices from the price history the first time it exists."""
+    if conn.execute(text("SELECT 1 FROM latest_prices LIMIT 1")).first():
+        return
+    result = conn.execute(text(
+        "INSERT INTO latest_prices (station_id, tag, price, updated, updated_at) "
+        "SELECT station_id, tag, price, updated, updated_at FROM ("
+        "SELECT station_id, tag, price, updated, updated_at, ROW_NUMBER() OVER ("
+        "PARTITION BY station_id, tag ORDER BY updated DESC, id DESC) AS rank FROM prices"
+        ") AS ranked WHERE rank = 1"
+    ))
+    logger.info(f"Backfilled {result.rowcount} latest price rows")
+
+
+def add_postgis_location(conn):
+    """On PostgreSQL with PostGIS, keep a geography point per station behind a GiST index."""
+    if conn.dialect.name != "postgresql" or not settings.POSTGIS_ENABLED:
+        return
+    if not conn.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")).first():
+        logger.warning("PostGIS is not available, radius search falls back to the in-process index")
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+    conn.execute(text(
+        "ALTER TABLE stations ADD COLUMN IF NOT EXISTS location geography(Point, 4326) "
+        "GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(location_longitude, location_latitude), 4326)::geography) STORED"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_stations_location_geog ON stations USING GIST (location)"))
+
+
+def optimize(conn):
+    """Refresh planner statistics for newly created indexes."""
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("PRAGMA optimize"))
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("ANALYZE stations"))
+
+
+MIGRATIONS = [
+    dedupe_prices,
+    create_missing_indexes,
+    drop_unused_indexes,
+    backfill_latest_prices,
+    add_postgis_location,
+    optimize,
+]
+
+
+def tables_exist(conn) -> bool:
+    existing = set(inspect(conn).get_table_names())
+    return all(table.name in existing for table in Base.metadata.sorted_tables)
+
+
+def run_migrations(conn):
+    for migration in MIGRATIONS:
+        migration(conn)
@@ -0,0 +1,83 @@
+import asyncio
+import random
+import time
+import aiohttp
+from fastapi import HTTPException
+from loguru import logger
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_CIRCUIT_OPENED, UPSTREAM_RETRIES
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, endpoint: str):
+        super().__init__(status_code=503, detail=f"Upstream {endpoint} is unavailable")
+
+
+class CircuitBreaker:
+    """Fail fast after CIRCUIT_FAILURE_THRESHOLD consecutive upstream failures.
+
+    While open, calls are rejected without touching the network. After
+    CIRCUIT_RESET_TIMEOUT seconds a single trial call is let through; its
+    outcome closes the circuit again or reopens it.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_timeout: float):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial):
+            raise CircuitOpenError(self.endpoint)
+        if state == "half_open":
+            self.trial = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial:
+                logger.warning(f"Opening circuit for upstream {self.endpoint} after {self.failures} failures")
+                UPSTREAM_CIRCUIT_OPENED.labels(self.endpoint).inc()
+            self.opened_at = time.monotonic()
+            self.trial = False
+
+
+def is_transient(error: Exception) -> bool:
+    """Timeouts, connection errors, 429 and 5xx are worth retrying; an open circuit is not."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, HTTPException):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(settings.UPSTREAM_RETRY_MAX_DELAY, settings.UPSTREAM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def with_retries(endpoint: str, fn):
+    """Await `fn()`, retrying transient failures up to UPSTREAM_RETRIES times."""
+    for attempt in range(settings.UPSTREAM_RETRIES + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == settings.UPSTREAM_RETRIES or not is_transient(e):
+                raise
+            UPSTREAM_RETRIES.labels(endpoint).inc()
+            await asyncio.sleep(backoff_delay(attempt))
@@ -0,0 +1,21 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task."""
+
+    def __init__(self):
+        self.calls = {}
+
+    def _done(self, key, future):
+        self.calls.pop(key, None)
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, key, fn):
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self.calls[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        return await asyncio.shield(future)
@@ -0,0 +1,45 @@
+import time
+from contextlib import contextmanager
+from loguru import logger
+
+
+class StartupTracker:
+    """Per-phase timing and warm-up state of this worker, reported by /readyz."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {}
+        self.errors = {}
+        self.warm_after = None
+
+    @property
+    def warm(self) -> bool:
+        return self.warm_after is not None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e)
+            raise
+        finally:
+            self.phases[name] = time.perf_counter() - started
+            logger.info(f"Startup phase {name} took {self.phases[name] * 1000:.0f}ms")
+
+    def mark_warm(self):
+        self.warm_after = time.monotonic() - self.started
+        logger.info(f"Worker warmed up {self.warm_after * 1000:.0f}ms after start")
+
+    def status(self):
+        return {
+            "warm": self.warm,
+            "warm_after_ms": round(self.warm_after * 1000) if self.warm else None,
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "phases_ms": {name: round(seconds * 1000) for name, seconds in self.phases.items()},
+            "errors": self.errors,
+        }
+
+
+startup = StartupTracker()
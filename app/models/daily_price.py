@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from app.core.database import Base
+
+class DailyPrice(Base):
+    __tablename__ = "daily_prices"
+
+    station_id = Column(String, ForeignKey("stations.id"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    day = Column(String, primary_key=True)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    avg_price = Column(Float)
+    samples = Column(Integer)
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, Float, DateTime
+from app.core.database import Base
+
+class StationDemand(Base):
+    __tablename__ = "station_demand"
+
+    station_id = Column(String, primary_key=True)
+    hits = Column(Float, default=0)
+    last_requested_at = Column(DateTime)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Index
+from app.core.database import Base
+
+class LatestPrice(Base):
+    __tablename__ = "latest_prices"
+    __table_args__ = (
+        Index("ix_latest_prices_tag_price", "tag", "price"),
+        Index("ix_latest_prices_updated_at", "updated_at"),
+    )
+
+    station_id = Column(String, ForeignKey("stations.id"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    price = Column(Float)
+    updated = Column(String)
+    updated_at = Column(DateTime)
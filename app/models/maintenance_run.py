@@ -0,0 +1,8 @@
+from sqlalchemy import Column, String, DateTime
+from app.core.database import Base
+
+class MaintenanceRun(Base):
+    __tablename__ = "maintenance_runs"
+
+    name = Column(String, primary_key=True)
+    finished_at = Column(DateTime)
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 class Price(Base):
     __tablename__ = "prices"
+    __table_args__ = (
+        Index("ux_prices_station_tag_updated", "station_id", "tag", "updated", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     station_id = Column(String, ForeignKey("stations.id"))
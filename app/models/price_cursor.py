@@ -0,0 +1,9 @@
+from sqlalchemy import Column, String, DateTime
+from app.core.database import Base
+
+class PriceCursor(Base):
+    __tablename__ = "price_cursors"
+
+    station_id = Column(String, primary_key=True)
+    since = Column(String)
+    checked_at = Column(DateTime)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Boolean, DateTime
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -20,3 +20,9 @@ class Station(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
     prices = relationship("Price", back_populates="station")
+
+    __table_args__ = (
+        Index("ix_stations_name_lower", func.lower(name)),
+        Index("ix_stations_chain_lower", func.lower(chain)),
+        Index("ix_stations_location", location_latitude, location_longitude),
+    )
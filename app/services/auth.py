@@ -1,10 +1,10 @@
-import aiohttp
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core.http import http_client
 from loguru import logger
 
 class AuthService:
-    BASE_URL = "https://api.tankille.fi"
+    BASE_URL = settings.TANKILLE_API_URL
 
     @staticmethod
     async def login():
@@ -22,13 +22,12 @@ class AuthService:
             "accept-language": "en"
         }
         logger.info(f"Sending login request to {url}")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    logger.error(f"Login failed with status code {response.status}")
-                    raise HTTPException(status_code=response.status, detail="Login failed")
-                logger.info("Login successful")
-                return await response.json()
+        async with http_client.request("POST", url, endpoint="login", json=payload, headers=headers) as response:
+            if response.status != 200:
+                logger.error(f"Login failed with status code {response.status}")
+                raise HTTPException(status_code=response.status, detail="Login failed")
+            logger.info("Login successful")
+            return await response.json()
 
     @staticmethod
     async def refresh(token: str):
@@ -42,10 +41,9 @@ class AuthService:
             "accept-language": "en"
         }
         logger.info(f"Sending refresh request to {url}")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    logger.error(f"Token refresh failed with status code {response.status}")
-                    raise HTTPException(status_code=response.status, detail="Token refresh failed")
-                logger.info("Token refresh successful")
-                return await response.json()
+        async with http_client.request("POST", url, endpoint="refresh", json=payload, headers=headers) as response:
+            if response.status != 200:
+                logger.error(f"Token refresh failed with status code {response.status}")
+                raise HTTPException(status_code=response.status, detail="Token refresh failed")
+            logger.info("Token refresh successful")
+            return await response.json()
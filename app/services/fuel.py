@@ -1,10 +1,12 @@
-import aiohttp
 from fastapi import HTTPException
 from app.core.config import settings
+from app.core.http import http_client
+from app.core.logging import sampled
+from app.core.resilience import with_retries
 from loguru import logger
 
 class FuelService:
-    BASE_URL = "https://api.tankille.fi"
+    BASE_URL = settings.TANKILLE_API_URL
 
     @staticmethod
     async def get_stations(token: str):
@@ -17,14 +19,17 @@ class FuelService:
             "accept-encoding": "gzip;q=1.0, compress;q=0.5"
         }
         logger.info(f"Sending get stations request to {url}")
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
+
+        async def fetch():
+            async with http_client.request("GET", url, endpoint="stations", headers=headers) as response:
                 if response.status != 200:
                     logger.error(f"Failed to get stations with status code {response.status}")
                     raise HTTPException(status_code=response.status, detail="Failed to get stations")
                 logger.info("Get stations request successful")
                 return await response.json()
 
+        return await with_retries("stations", fetch)
+
     @staticmethod
     async def get_station_prices(station_id: str, token: str, since: str):
         url = f"{FuelService.BASE_URL}/stations/{station_id}/prices"
@@ -36,11 +41,15 @@ class FuelService:
             "accept-language": "en",
             "accept-encoding": "gzip;q=1.0, compress;q=0.5"
         }
-        logger.info(f"Sending get station prices request to {url}")
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
+        logger.debug(f"Sending get station prices request to {url}")
+
+        async def fetch():
+            async with http_client.request("GET", url, endpoint="station_prices", headers=headers, params=params) as response:
                 if response.status != 200:
-                    logger.error(f"Failed to get station prices with status code {response.status}")
+                    logger.error(f"Failed to get station prices for station {station_id} with status code {response.status}")
                     raise HTTPException(status_code=response.status, detail="Failed to get station prices")
-                logger.info("Get station prices request successful")
+                if sampled():
+                    logger.info(f"Get station prices request successful for station {station_id} (sampled)")
                 return await response.json()
+
+        return await with_retries("station_prices", fetch)
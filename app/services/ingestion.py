@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import select, update
+from loguru import logger
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, upsert
+from app.core.locks import is_leader
+from app.models.demand import StationDemand
+from app.models.price_cursor import PriceCursor
+from app.models.station import Station
+from app.services.prices import PriceService
+from app.services.tokens import token_manager
+
+# Age assigned to stations that have never been fetched, so they sort first.
+NEVER_FETCHED_AGE = 7 * 24 * 3600
+
+
+class DemandTracker:
+    """Per-worker counter of station requests, flushed to the shared database."""
+
+    def __init__(self):
+        self.hits = Counter()
+
+    def record(self, station_ids):
+        self.hits.update(station_ids)
+
+    async def flush(self):
+        if not self.hits:
+            return
+        hits, self.hits = self.hits, Counter()
+        now = datetime.utcnow()
+        statement = upsert(StationDemand)
+        statement = statement.on_conflict_do_update(
+            index_elements=[StationDemand.station_id],
+            set_={
+                "hits": StationDemand.hits + statement.excluded.hits,
+                "last_requested_at": statement.excluded.last_requested_at
+            }
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement, [
+                {"station_id": station_id, "hits": count, "last_requested_at": now}
+                for station_id, count in hits.items()
+            ])
+            await db.commit()
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.DEMAND_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush station demand: {e}")
+
+
+class IngestionScheduler:
+    """Refresh stale station prices in the background on the leader worker.
+
+    Each cycle orders stale stations by age weighted with request demand and
+    refreshes at most INGESTION_RATE stations per second until the next cycle.
+    """
+
+    async def build_queue(self):
+        now = datetime.utcnow()
+        query = (
+            select(Station.id, PriceCursor.checked_at, StationDemand.hits)
+            .outerjoin(PriceCursor, PriceCursor.station_id == Station.id)
+            .outerjoin(StationDemand, StationDemand.station_id == Station.id)
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            rows = result.all()
+
+        queue = []
+        max_age = PriceService.MAX_AGE.total_seconds()
+        for station_id, checked_at, hits in rows:
+            age = (now - checked_at).total_seconds() if checked_at else NEVER_FETCHED_AGE
+            if age < max_age:
+                continue
+            heapq.heappush(queue, (-age * (1 + (hits or 0)), station_id))
+        return queue
+
+    async def decay_demand(self):
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(StationDemand).values(hits=StationDemand.hits * settings.DEMAND_DECAY))
+            await db.commit()
+
+    async def run_cycle(self):
+        queue = await self.build_queue()
+        budget = int(settings.INGESTION_RATE * settings.INGESTION_INTERVAL)
+        batch_size = max(1, int(settings.INGESTION_RATE))
+        refreshed = 0
+        if queue:
+            logger.info(f"Ingestion cycle: {len(queue)} stale stations, refreshing up to {budget}")
+        while queue and refreshed < budget:
+            batch = [heapq.heappop(queue)[1] for _ in range(min(batch_size, len(queue), budget - refreshed))]
+            results = await asyncio.gather(
+                *[PriceService.refresh(station_id) for station_id in batch],
+                asyncio.sleep(len(batch) / settings.INGESTION_RATE),
+                return_exceptions=True
+            )
+            failures = [(station_id, outcome) for station_id, outcome in zip(batch, results) if isinstance(outcome, Exception)]
+            if failures:
+                logger.error(f"Background refresh failed for {len(failures)} stations, first {failures[0][0]}: {failures[0][1]}")
+            refreshed += len(batch)
+        await self.decay_demand()
+
+    async def run(self):
+        while True:
+            try:
+                if await token_manager.get_access_token() and is_leader():
+                    await self.run_cycle()
+            except Exception as e:
+                logger.error(f"Ingestion cycle failed: {e}")
+            await asyncio.sleep(settings.INGESTION_INTERVAL)
+
+
+demand_tracker = DemandTracker()
+ingestion_scheduler = IngestionScheduler()
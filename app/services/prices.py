@@ -0,0 +1,183 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, upsert
+from app.core.locks import FileLease
+from app.core.logging import sampled
+from app.core.singleflight import SingleFlight
+from app.models.latest_price import LatestPrice
+from app.models.price import Price
+from app.models.price_cursor import PriceCursor
+from app.services.fuel import FuelService
+from app.services.tokens import token_manager
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lists.
+CHUNK_SIZE = 500
+
+
+def chunked(items, size: int = CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+refreshes = SingleFlight()
+
+
+class PriceService:
+    MAX_AGE = timedelta(minutes=settings.PRICE_MAX_AGE_MINUTES)
+
+    @staticmethod
+    async def load_prices(db: AsyncSession, station_ids, latest: bool = False, tags=None, since=None):
+        """Load prices for many stations at once, grouped by station id.
+
+        With `latest` only the newest observation per (station, tag) is
+        returned, read from the latest_prices table. `since` is a server-side
+        write position, not a report time: a Price.id for history, or a
+        LatestPrice.updated_at with `latest`. Only rows written after it are
+        returned, in write order.
+        """
+        model = LatestPrice if latest else Price
+        prices_by_station = {station_id: [] for station_id in station_ids}
+        for chunk in chunked(prices_by_station):
+            query = select(model).filter(model.station_id.in_(chunk))
+            if tags:
+                query = query.filter(model.tag.in_(tags))
+            if since is not None and latest:
+                # Rows stored in the same instant share updated_at; resending them is harmless
+                query = query.filter(LatestPrice.updated_at >= since).order_by(LatestPrice.updated_at)
+            elif since is not None:
+                query = query.filter(Price.id > since).order_by(Price.id)
+            result = await db.execute(query)
+            for price in result.scalars():
+                prices_by_station[price.station_id].append(price)
+        return prices_by_station
+
+    @staticmethod
+    async def load_checked_at(db: AsyncSession, station_ids):
+        """Return {station_id: datetime of the last upstream check} for many stations."""
+        checked_at = {}
+        for chunk in chunked(station_ids):
+            result = await db.execute(
+                select(PriceCursor.station_id, PriceCursor.checked_at).filter(PriceCursor.station_id.in_(chunk))
+            )
+            checked_at.update(result.all())
+        return checked_at
+
+    @staticmethod
+    async def changed_since(db: AsyncSession, since: datetime):
+        """Return ids of stations whose latest prices were written after `since`."""
+        result = await db.execute(
+            select(LatestPrice.station_id).filter(LatestPrice.updated_at > since).distinct()
+        )
+        return result.scalars().all()
+
+    @staticmethod
+    def is_stale(checked_at: datetime, now: datetime = None) -> bool:
+        return not checked_at or (now or datetime.utcnow()) - checked_at >= PriceService.MAX_AGE
+
+    @staticmethod
+    async def store(db: AsyncSession, station_id: str, prices_response) -> int:
+        """Insert observations newer than the stored ones, computing per-tag deltas.
+
+        Returns the number of new rows. The caller commits.
+        """
+        latest = (await PriceService.load_prices(db, [station_id], latest=True))[station_id]
+        previous = {price.tag: (price.updated or "", price.price) for price in latest}
+
+        observations = []
+        for price_data in prices_response:
+            timestamp = price_data.get("timestamp")
+            for price in price_data.get("prices", []):
+                observations.append((timestamp or "", price.get("tag"), price.get("value"), price_data.get("userId")))
+        observations.sort(key=lambda observation: observation[0])
+
+        now = datetime.utcnow()
+        rows = []
+        for timestamp, tag, value, reporter in observations:
+            last = previous.get(tag)
+            if last is not None and timestamp <= last[0]:
+                continue
+            rows.append({
+                "station_id": station_id,
+                "tag": tag,
+                "price": value,
+                "updated": timestamp,
+                "delta": value - last[1] if last is not None and value is not None and last[1] is not None else 0,
+                "reporter": reporter,
+                "updated_at": now
+            })
+            previous[tag] = (timestamp, value)
+
+        if rows:
+            await db.execute(upsert(Price).on_conflict_do_nothing(
+                index_elements=[Price.station_id, Price.tag, Price.updated]
+            ), rows)
+            newest = {row["tag"]: row for row in rows}
+            statement = upsert(LatestPrice)
+            statement = statement.on_conflict_do_update(
+                index_elements=[LatestPrice.station_id, LatestPrice.tag],
+                set_={
+                    "price": statement.excluded.price,
+                    "updated": statement.excluded.updated,
+                    "updated_at": statement.excluded.updated_at
+                },
+                where=func.coalesce(LatestPrice.updated, "") < statement.excluded.updated
+            )
+            await db.execute(statement, [
+                {key: row[key] for key in ("station_id", "tag", "price", "updated", "updated_at")}
+                for row in newest.values()
+            ])
+            response_cache.invalidate_stations([station_id])
+
+        cursor = upsert(PriceCursor).values(
+            station_id=station_id,
+            since=observations[-1][0] if observations else None,
+            checked_at=now
+        )
+        await db.execute(cursor.on_conflict_do_update(
+            index_elements=[PriceCursor.station_id],
+            set_={
+                "since": func.coalesce(cursor.excluded.since, PriceCursor.since),
+                "checked_at": cursor.excluded.checked_at
+            }
+        ))
+        return len(rows)
+
+    @staticmethod
+    async def refresh(station_id: str) -> bool:
+        """Refresh one station's prices from upstream.
+
+        Concurrent callers in this worker share one in-flight fetch, and a
+        per-station file lease keeps other workers from fetching it at the
+        same time. Returns True if this call checked upstream.
+        """
+        return await refreshes.do(station_id, lambda: PriceService._refresh(station_id))
+
+    @staticmethod
+    async def _refresh(station_id: str) -> bool:
+        lease = FileLease(f"prices-{station_id}")
+        if not lease.acquire():
+            logger.debug(f"Prices for station {station_id} are being refreshed by another worker")
+            await lease.wait_released(settings.LOCK_WAIT_TIMEOUT)
+            return False
+        try:
+            async with AsyncSessionLocal() as db:
+                cursor = await db.get(PriceCursor, station_id)
+                if cursor and not PriceService.is_stale(cursor.checked_at):
+                    return False
+
+                since = cursor.since if cursor and cursor.since else settings.PRICE_SINCE_DEFAULT
+                if sampled():
+                    logger.info(f"Fetching prices from API for station {station_id} since {since} (sampled)")
+                prices_response = await token_manager.call(
+                    lambda token: FuelService.get_station_prices(station_id, token, since=since)
+                )
+                await PriceService.store(db, station_id, prices_response)
+                await db.commit()
+                return True
+        finally:
+            lease.release()
@@ -0,0 +1,211 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine, upsert
+from app.core.locks import FileLease, is_leader
+from app.models.daily_price import DailyPrice
+from app.models.maintenance_run import MaintenanceRun
+from app.models.price import Price
+
+
+class RetentionService:
+    """Fold price history older than RETENTION_DAYS into daily_prices.
+
+    Old observations are aggregated into per-day min/max/avg rows and deleted
+    RETENTION_BATCH_SIZE at a time, each batch in its own short transaction,
+    so readers and the ingestion writer are only ever blocked briefly.
+    """
+
+    @staticmethod
+    def cutoff(days: int = None) -> str:
+        """First day to keep raw, comparable with the ISO timestamps in Price.updated."""
+        days = settings.RETENTION_DAYS if days is None else days
+        return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+    @staticmethod
+    async def compact_batch(db: AsyncSession, cutoff: str, batch_size: int):
+        """Downsample and delete one batch of old rows. Returns (rows deleted, station ids)."""
+        result = await db.execute(
+            select(Price.id, Price.station_id, Price.tag, Price.price, Price.updated)
+            .filter(Price.updated < cutoff)
+            .order_by(Price.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return 0, set()
+
+        days = {}
+        for row in rows:
+            if row.price is None or not row.updated:
+                continue
+            key = (row.station_id, row.tag, row.updated[:10])
+            day = days.get(key)
+            if day is None:
+                days[key] = [row.price, row.price, row.price, 1]
+            else:
+                day[0] = min(day[0], row.price)
+                day[1] = max(day[1], row.price)
+                day[2] += row.price
+                day[3] += 1
+
+        if days:
+            statement = upsert(DailyPrice)
+            excluded = statement.excluded
+            # A day can span several batches or runs, so merge into the existing aggregate
+            statement = statement.on_conflict_do_update(
+                index_elements=[DailyPrice.station_id, DailyPrice.tag, DailyPrice.day],
+                set_={
+                    "min_price": case((excluded.min_price < DailyPrice.min_price, excluded.min_price), else_=DailyPrice.min_price),
+                    "max_price": case((excluded.max_price > DailyPrice.max_price, excluded.max_price), else_=DailyPrice.max_price),
+                    "avg_price": (DailyPrice.avg_price * DailyPrice.samples + excluded.avg_price * excluded.samples)
+                                 / (DailyPrice.samples + excluded.samples),
+                    "samples": DailyPrice.samples + excluded.samples
+                }
+            )
+            await db.execute(statement, [
+                {
+                    "station_id": station_id,
+                    "tag": tag,
+                    "day": day,
+                    "min_price": low,
+                    "max_price": high,
+                    "avg_price": total / samples,
+                    "samples": samples
+                }
+                for (station_id, tag, day), (low, high, total, samples) in days.items()
+            ])
+        await db.execute(delete(Price).where(Price.id.in_([row.id for row in rows])))
+        await db.commit()
+        return len(rows), {row.station_id for row in rows}
+
+    @staticmethod
+    async def compact(cutoff: str, batch_size: int) -> int:
+        deleted = 0
+        station_ids = set()
+        async with AsyncSessionLocal() as db:
+            while True:
+                count, stations = await RetentionService.compact_batch(db, cutoff, batch_size)
+                if not count:
+                    break
+                deleted += count
+                station_ids |= stations
+                # Let queued requests and writers in between batches
+                await asyncio.sleep(0)
+        response_cache.invalidate_stations(station_ids)
+        return deleted
+
+    @staticmethod
+    def database_bytes(conn) -> int:
+        if conn.dialect.name == "sqlite":
+            page_count = conn.execute(text("PRAGMA page_count")).scalar()
+            page_size = conn.execute(text("PRAGMA page_size")).scalar()
+            return page_count * page_size
+        if conn.dialect.name == "postgresql":
+            return conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+        return 0
+
+    @staticmethod
+    def vacuum(conn, mode: str):
+        """Return freed space to the OS. Must run outside a transaction."""
+        if mode == "none":
+            return
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("VACUUM FULL ANALYZE prices" if mode == "full" else "VACUUM ANALYZE prices"))
+        elif conn.dialect.name != "sqlite":
+            return
+        elif mode == "full":
+            conn.execute(text("VACUUM"))
+        elif conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            # The driver may step incremental_vacuum only partially, so repeat while it makes progress
+            free_pages = conn.execute(text("PRAGMA freelist_count")).scalar()
+            while free_pages:
+                conn.execute(text("PRAGMA incremental_vacuum"))
+                remaining = conn.execute(text("PRAGMA freelist_count")).scalar()
+                if remaining >= free_pages:
+                    break
+                free_pages = remaining
+        else:
+            logger.info(
+                "SQLite auto_vacuum is not INCREMENTAL: freed pages will be reused, but the file "
+                "only shrinks after one run with RETENTION_VACUUM=full"
+            )
+
+    @staticmethod
+    async def last_run(db: AsyncSession):
+        """When retention last finished, in any process, or None if it never has."""
+        return await db.scalar(select(MaintenanceRun.finished_at).filter(MaintenanceRun.name == "retention"))
+
+    @staticmethod
+    async def record_run(db: AsyncSession, finished_at: datetime):
+        statement = upsert(MaintenanceRun).values(name="retention", finished_at=finished_at)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[MaintenanceRun.name],
+            set_={"finished_at": statement.excluded.finished_at}
+        ))
+        await db.commit()
+
+    @staticmethod
+    async def run(days: int = None, vacuum: str = None, batch_size: int = None):
+        """Downsample, delete and vacuum. Returns a report, or None if another process is running it."""
+        lease = FileLease("retention")
+        if not lease.acquire():
+            logger.info("Price retention is already running elsewhere, skipping")
+            return None
+        try:
+            started = time.perf_counter()
+            cutoff = RetentionService.cutoff(days)
+            async with engine.connect() as conn:
+                bytes_before = await conn.run_sync(RetentionService.database_bytes)
+            deleted = await RetentionService.compact(cutoff, batch_size or settings.RETENTION_BATCH_SIZE)
+            if deleted:
+                async with engine.connect() as conn:
+                    conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                    await conn.run_sync(RetentionService.vacuum, vacuum or settings.RETENTION_VACUUM)
+            async with engine.connect() as conn:
+                bytes_after = await conn.run_sync(RetentionService.database_bytes)
+            async with AsyncSessionLocal() as db:
+                await RetentionService.record_run(db, datetime.utcnow())
+        finally:
+            lease.release()
+
+        report = {
+            "cutoff": cutoff,
+            "rows_deleted": deleted,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": max(0, bytes_before - bytes_after),
+            "seconds": round(time.perf_counter() - started, 2)
+        }
+        logger.info(
+            f"Price retention before {cutoff}: {deleted} rows downsampled and deleted, "
+            f"{report['bytes_reclaimed']} bytes reclaimed in {report['seconds']}s"
+        )
+        return report
+
+    @staticmethod
+    async def run_periodically():
+        """On the leader, run retention whenever the last recorded run is RETENTION_INTERVAL old.
+
+        The last run time is stored in the database, so a restart neither
+        skips an overdue run nor repeats a recent one.
+        """
+        while True:
+            delay = settings.RETENTION_INTERVAL
+            if is_leader():
+                try:
+                    async with AsyncSessionLocal() as db:
+                        last_run = await RetentionService.last_run(db)
+                    if last_run is not None:
+                        delay = settings.RETENTION_INTERVAL - (datetime.utcnow() - last_run).total_seconds()
+                    if last_run is None or delay <= 0:
+                        await RetentionService.run()
+                        delay = settings.RETENTION_INTERVAL
+                except Exception as e:
+                    logger.error(f"Price retention failed: {e}")
+            await asyncio.sleep(delay)
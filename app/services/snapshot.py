@@ -0,0 +1,173 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+from app.core.config import settings
+from app.models.station import Station
+from app.services.spatial import SpatialIndex, bounding_box, haversine_many, station_index
+
+MAGIC = b"TRSNAP04"
+# magic, version, station count, cell count, id width, padding, cell size in degrees
+HEADER = struct.Struct("<8sQIII4xd")
+
+
+def cell_key(i: int, j: int) -> int:
+    """Order grid cells by row, then column, as one signed 64-bit key."""
+    return i * 4294967296 + j + 2147483648
+
+
+def _padded(length: int) -> int:
+    return (length + 7) & ~7
+
+
+class StationSnapshot:
+    """Grid index over station coordinates, memory-mapped and shared by all workers.
+
+    The leader writes the file with `write`; every worker maps it read-only
+    and remaps when a new version is atomically swapped in. Queries run
+    straight against the mapping, so workers keep no per-station objects.
+    Layout: header, sorted int64 cell keys, float64 latitude/longitude columns
+    sorted by cell, int32 row offset of each cell (plus one end offset), then
+    fixed-width NUL-padded station ids.
+    """
+
+    # Same grid cell and ring search as the in-process index
+    _cell = SpatialIndex._cell
+    nearest = SpatialIndex.nearest
+
+    def __init__(self, path: str, cell_degrees: float = 0.1):
+        self.path = path
+        self.cell_degrees = cell_degrees
+        self.version = 0
+        self.identity = None
+        self.checked_at = 0.0
+        self.size = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.size > 0
+
+    @staticmethod
+    async def build(db: AsyncSession, path: str, cell_degrees: float = 0.1) -> int:
+        stations = (await db.execute(
+            select(Station.id, Station.location_latitude, Station.location_longitude)
+            .filter(Station.location_latitude.isnot(None), Station.location_longitude.isnot(None))
+        )).all()
+        version = await asyncio.to_thread(StationSnapshot.write, path, stations, cell_degrees)
+        logger.info(f"Wrote station snapshot version {version} with {len(stations)} stations")
+        return version
+
+    @staticmethod
+    def write(path: str, stations, cell_degrees: float = 0.1) -> int:
+        grid = SpatialIndex(cell_degrees)
+        rows = sorted(
+            (cell_key(*grid._cell(latitude, longitude)), station_id.encode(), latitude, longitude)
+            for station_id, latitude, longitude in stations
+        )
+        keys, offsets = array("q"), array("i")
+        latitudes, longitudes = array("d"), array("d")
+        for row, (key, _, latitude, longitude) in enumerate(rows):
+            if not keys or keys[-1] != key:
+                keys.append(key)
+                offsets.append(row)
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+        offsets.append(len(rows))
+        id_width = max((len(station_id) for _, station_id, _, _ in rows), default=0)
+        ids = b"".join(station_id.ljust(id_width, b"\0") for _, station_id, _, _ in rows)
+
+        version = time.time_ns()
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, version, len(rows), len(keys), id_width, cell_degrees))
+            for column in (keys, latitudes, longitudes, offsets):
+                column.tofile(f)
+            f.write(b"\0" * (_padded(len(offsets) * offsets.itemsize) - len(offsets) * offsets.itemsize))
+            f.write(ids)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return version
+
+    def refresh(self, interval: float = 1.0):
+        """Remap the file if a newer version was swapped in (checked at most every `interval` seconds)."""
+        now = time.monotonic()
+        if now - self.checked_at < interval:
+            return
+        self.checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self.identity:
+            return
+        try:
+            self._map(identity)
+        except Exception as e:
+            logger.error(f"Failed to map station snapshot {self.path}: {e}")
+
+    def _map(self, identity):
+        with open(self.path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, cell_count, id_width, cell_degrees = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("not a station snapshot")
+        offset = HEADER.size
+        view = memoryview(buffer)
+
+        def column(fmt: str, length: int):
+            nonlocal offset
+            size = length * struct.calcsize(fmt)
+            values = view[offset:offset + size].cast(fmt)
+            offset += _padded(size)
+            return values
+
+        self.keys = column("q", cell_count)
+        self.latitudes = column("d", count)
+        self.longitudes = column("d", count)
+        self.offsets = column("i", cell_count + 1)
+        self.ids = view[offset:offset + count * id_width]
+        self.id_width = id_width
+        self.cell_degrees = cell_degrees
+        self.version = version
+        self.size = count
+        self.identity = identity
+        # Searches use the mapping from now on; free the private index if one was built
+        if station_index.ready:
+            station_index.rebuild(())
+        logger.info(f"Mapped station snapshot version {version} with {count} stations in {cell_count} cells")
+
+    def station_id(self, row: int) -> str:
+        start = row * self.id_width
+        return bytes(self.ids[start:start + self.id_width]).rstrip(b"\0").decode()
+
+    def within(self, latitude: float, longitude: float, distance: float):
+        """Return {station_id: meters} for every station within `distance` meters."""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance)
+        lat_lo, lon_lo = self._cell(min_lat, min_lon)
+        lat_hi, lon_hi = self._cell(max_lat, max_lon)
+        keys, offsets = self.keys, self.offsets
+        spans = []
+        # Cells of one grid row are contiguous in key order, so each row is one bisect
+        for i in range(lat_lo, lat_hi + 1):
+            first = bisect_left(keys, cell_key(i, lon_lo))
+            last = bisect_right(keys, cell_key(i, lon_hi))
+            if first < last:
+                spans.append(range(offsets[first], offsets[last]))
+        rows = list(chain.from_iterable(spans))
+        latitudes, longitudes = self.latitudes, self.longitudes
+        distances = haversine_many(latitude, longitude, [(latitudes[row], longitudes[row]) for row in rows])
+        return {self.station_id(row): d for row, d in zip(rows, distances) if d <= distance}
+
+
+station_snapshot = StationSnapshot(settings.SNAPSHOT_PATH)
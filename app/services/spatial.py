@@ -0,0 +1,95 @@
+import heapq
+import math
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+def haversine_many(latitude: float, longitude: float, points):
+    """Great-circle distances in meters from one origin to many (lat, lon) points."""
+    lat1 = math.radians(latitude)
+    lon1 = math.radians(longitude)
+    cos_lat1 = math.cos(lat1)
+    sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+    distances = []
+    for lat2, lon2 in points:
+        if lat2 is None or lon2 is None or lat2 != lat2 or lon2 != lon2:
+            distances.append(float("inf"))
+            continue
+        lat2 = radians(lat2)
+        dlat = lat2 - lat1
+        dlon = radians(lon2) - lon1
+        a = sin(dlat / 2) ** 2 + cos_lat1 * cos(lat2) * sin(dlon / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a))))
+    return distances
+
+
+def bounding_box(latitude: float, longitude: float, distance: float):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of `distance` meters."""
+    dlat = distance / METERS_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, distance / (METERS_PER_DEGREE * cos_lat))
+    return latitude - dlat, latitude + dlat, longitude - dlon, longitude + dlon
+
+
+class SpatialIndex:
+    """Grid-bucketed in-memory index over station coordinates."""
+
+    def __init__(self, cell_degrees: float = 0.1):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.size = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.size > 0
+
+    def _cell(self, latitude: float, longitude: float):
+        return int(math.floor(latitude / self.cell_degrees)), int(math.floor(longitude / self.cell_degrees))
+
+    def rebuild(self, rows):
+        """Replace the index contents with (station_id, latitude, longitude) rows."""
+        cells = {}
+        size = 0
+        for station_id, latitude, longitude in rows:
+            if latitude is None or longitude is None:
+                continue
+            cells.setdefault(self._cell(latitude, longitude), []).append((station_id, latitude, longitude))
+            size += 1
+        self.cells = cells
+        self.size = size
+
+    def _candidates(self, latitude: float, longitude: float, distance: float):
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance)
+        lat_lo, lon_lo = self._cell(min_lat, min_lon)
+        lat_hi, lon_hi = self._cell(max_lat, max_lon)
+        candidates = []
+        cells = self.cells
+        for i in range(lat_lo, lat_hi + 1):
+            for j in range(lon_lo, lon_hi + 1):
+                bucket = cells.get((i, j))
+                if bucket:
+                    candidates.extend(bucket)
+        return candidates
+
+    def within(self, latitude: float, longitude: float, distance: float):
+        """Return {station_id: meters} for every station within `distance` meters."""
+        candidates = self._candidates(latitude, longitude, distance)
+        distances = haversine_many(latitude, longitude, [(lat, lon) for _, lat, lon in candidates])
+        return {c[0]: d for c, d in zip(candidates, distances) if d <= distance}
+
+    def nearest(self, latitude: float, longitude: float, k: int, max_distance: float = None):
+        """Return up to `k` (station_id, meters) pairs ordered by distance."""
+        if k <= 0 or not self.ready:
+            return []
+        radius = self.cell_degrees * METERS_PER_DEGREE
+        limit = max_distance if max_distance is not None else math.pi * EARTH_RADIUS_M
+        while True:
+            radius = min(radius, limit)
+            found = self.within(latitude, longitude, radius)
+            if len(found) >= k or radius >= limit:
+                return heapq.nsmallest(k, found.items(), key=lambda item: item[1])
+            radius *= 2
+
+
+station_index = SpatialIndex()
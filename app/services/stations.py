@@ -0,0 +1,118 @@
+import hashlib
+import time
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+from app.core.config import settings
+from app.core.database import upsert
+from app.models.station import Station
+from app.services.prices import chunked
+
+STATION_COLUMNS = (
+    "name",
+    "chain",
+    "brand",
+    "address_street",
+    "address_city",
+    "address_zipcode",
+    "address_country",
+    "location_latitude",
+    "location_longitude",
+    "is_visible",
+)
+
+
+def station_row(station):
+    """Map an upstream station document to Station column values."""
+    is_visible = station.get("isVisible", False)
+    if isinstance(is_visible, int):
+        is_visible = bool(is_visible)
+    return {
+        "id": station["_id"],
+        "name": station["name"],
+        "chain": station["chain"],
+        "brand": station["brand"],
+        "address_street": station["address"]["street"],
+        "address_city": station["address"]["city"],
+        "address_zipcode": station["address"]["zipcode"],
+        "address_country": station["address"]["country"],
+        "location_latitude": float(station["location"]["coordinates"][1]),
+        "location_longitude": float(station["location"]["coordinates"][0]),
+        "is_visible": is_visible,
+    }
+
+
+def content_hash(values) -> str:
+    return hashlib.sha1(repr(tuple(values)).encode()).hexdigest()
+
+
+class StationService:
+    @staticmethod
+    async def sync(db: AsyncSession, stations_data):
+        """Bring the stations table in line with the upstream station list.
+
+        Existing rows are diffed in memory by content hash, then inserts,
+        updates and visibility changes are applied as batched executemany
+        statements. Returns the change counts and timings.
+
+        Missing stations are only hidden when the upstream list holds at least
+        STATION_SYNC_MIN_RATIO of the stations already stored, so an empty or
+        truncated upstream response cannot hide the whole table.
+        """
+        started = time.perf_counter()
+        upstream = {}
+        for station in stations_data:
+            try:
+                row = station_row(station)
+            except Exception as e:
+                logger.error(f"Error parsing station {station.get('_id')}: {e}")
+                continue
+            upstream[row["id"]] = row
+
+        result = await db.execute(select(Station.id, *[getattr(Station, column) for column in STATION_COLUMNS]))
+        rows = result.all()
+        existing = {row[0]: content_hash(row[1:]) for row in rows}
+        # is_visible is the last column; only stations still shown can become hidden
+        visible = [row[0] for row in rows if row[-1]]
+        loaded = time.perf_counter()
+
+        inserts = [row for station_id, row in upstream.items() if station_id not in existing]
+        updates = [
+            row for station_id, row in upstream.items()
+            if station_id in existing and existing[station_id] != content_hash(row[column] for column in STATION_COLUMNS)
+        ]
+        hidden = [station_id for station_id in visible if station_id not in upstream]
+        if hidden and len(upstream) < len(existing) * settings.STATION_SYNC_MIN_RATIO:
+            logger.warning(
+                f"Upstream returned {len(upstream)} stations for {len(existing)} stored, "
+                f"not hiding {len(hidden)} missing stations"
+            )
+            hidden = []
+
+        for batch in chunked(inserts):
+            await db.execute(upsert(Station).on_conflict_do_nothing(index_elements=[Station.id]), batch)
+        table = Station.__table__
+        update_statement = (
+            update(table)
+            .where(table.c.id == bindparam("station_id"))
+            .values({column: bindparam(column) for column in STATION_COLUMNS})
+        )
+        for batch in chunked(updates):
+            await db.execute(update_statement, [
+                {"station_id": row["id"], **{column: row[column] for column in STATION_COLUMNS}} for row in batch
+            ])
+        for batch in chunked(hidden):
+            await db.execute(update(table).where(table.c.id.in_(batch), table.c.is_visible.is_(True)).values(is_visible=False))
+        await db.commit()
+        finished = time.perf_counter()
+
+        stats = {
+            "upstream": len(upstream),
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "hidden": len(hidden),
+            "load_ms": round((loaded - started) * 1000, 1),
+            "write_ms": round((finished - loaded) * 1000, 1),
+        }
+        logger.info(f"Station sync finished: {stats}")
+        return stats
@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import json
+import time
+from fastapi import HTTPException
+from sqlalchemy import select
+from loguru import logger
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, upsert
+from app.core.locks import FileLease
+from app.core.metrics import TOKEN_REFRESHES
+from app.models.user import User
+from app.services.auth import AuthService
+
+
+def jwt_expiry(token: str):
+    """Return the `exp` claim of a JWT as unix seconds, or None if it cannot be read."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+class TokenManager:
+    """Upstream access tokens shared by all workers through the users table.
+
+    Tokens are renewed ahead of their JWT expiry by whichever worker takes
+    the "tokens" file lease first; the others reload the stored result
+    instead of logging in themselves.
+    """
+
+    def __init__(self):
+        self.access_token = None
+        self.refresh_token = None
+        self.expires_at = None
+        self.failed_at = 0.0
+        self.lock = asyncio.Lock()
+        self.renewal = None
+
+    def _set(self, access_token: str, refresh_token: str):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = jwt_expiry(access_token) if access_token else None
+        if access_token and self.expires_at is None:
+            self.expires_at = time.time() + settings.TOKEN_DEFAULT_TTL
+
+    def fresh(self) -> bool:
+        return bool(self.access_token) and self.expires_at - settings.TOKEN_REFRESH_MARGIN > time.time()
+
+    async def load(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(User.access_token, User.refresh_token).filter(User.email == settings.EMAIL))
+            row = result.first()
+        if row and row.access_token:
+            self._set(row.access_token, row.refresh_token)
+
+    async def save(self):
+        statement = upsert(User).values(
+            email=settings.EMAIL,
+            access_token=self.access_token,
+            refresh_token=self.refresh_token
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[User.email],
+            set_={"access_token": statement.excluded.access_token, "refresh_token": statement.excluded.refresh_token}
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    async def _renew(self, rejected_token: str = None):
+        await self.load()
+        if self.fresh() and self.access_token != rejected_token:
+            return
+        lease = FileLease("tokens")
+        if not lease.acquire():
+            await lease.wait_released(settings.LOCK_WAIT_TIMEOUT)
+            await self.load()
+            return
+        try:
+            await self.load()
+            if self.fresh() and self.access_token != rejected_token:
+                return
+            tokens = None
+            if self.refresh_token:
+                try:
+                    tokens = await AuthService.refresh(self.refresh_token)
+                    TOKEN_REFRESHES.labels("refresh_success").inc()
+                except Exception as e:
+                    logger.warning(f"Token refresh failed, logging in again: {e}")
+                    TOKEN_REFRESHES.labels("refresh_failure").inc()
+            if tokens is None:
+                login_response = await AuthService.login()
+                tokens = await AuthService.refresh(login_response.get("refreshToken"))
+                TOKEN_REFRESHES.labels("login_success").inc()
+            self._set(tokens.get("accessToken"), tokens.get("refreshToken") or self.refresh_token)
+            await self.save()
+            logger.info("Upstream tokens renewed")
+        finally:
+            lease.release()
+
+    async def get_access_token(self):
+        """Return a usable access token, renewing it if it is close to expiry."""
+        if self.fresh():
+            return self.access_token
+        async with self.lock:
+            # Back off after a failed renewal instead of retrying on every request
+            if not self.fresh() and time.time() - self.failed_at >= settings.TOKEN_RETRY_INTERVAL:
+                try:
+                    await self._renew()
+                except Exception as e:
+                    logger.error(f"Failed to login or refresh token: {e}")
+                    TOKEN_REFRESHES.labels("login_failure").inc()
+                    self.failed_at = time.time()
+        return self.access_token
+
+    def renew_in_background(self):
+        """Start renewing without waiting for it, unless a renewal is already running."""
+        if self.renewal is None or self.renewal.done():
+            self.renewal = asyncio.ensure_future(self.get_access_token())
+
+    async def invalidate(self, rejected_token: str):
+        async with self.lock:
+            if self.access_token == rejected_token:
+                try:
+                    await self._renew(rejected_token)
+                except Exception as e:
+                    logger.error(f"Failed to renew rejected token: {e}")
+                    TOKEN_REFRESHES.labels("login_failure").inc()
+
+    async def call(self, fn):
+        """Run `fn(access_token)`; on an upstream 401, renew the token and retry once."""
+        token = await self.get_access_token()
+        if not token:
+            raise HTTPException(status_code=401, detail="Access token missing or invalid")
+        try:
+            return await fn(token)
+        except HTTPException as e:
+            if e.status_code != 401:
+                raise
+            logger.warning("Upstream rejected the access token, renewing and retrying once")
+            await self.invalidate(token)
+            return await fn(await self.get_access_token())
+
+    async def refresh_periodically(self):
+        while True:
+            if self.expires_at:
+                delay = self.expires_at - settings.TOKEN_REFRESH_MARGIN - time.time()
+            else:
+                delay = settings.TOKEN_RETRY_INTERVAL
+            await asyncio.sleep(min(max(delay, settings.TOKEN_RETRY_INTERVAL), 3600))
+            await self.get_access_token()
+
+
+token_manager = TokenManager()
@@ -0,0 +1,99 @@
+"""Seed a SQLite database with synthetic stations and price history.
+
+    python -m bench.fixtures --db bench/data/bench.db --stations 50000 --history 40
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from bench.stub_server import make_stations, TAGS
+
+BATCH = 50000
+
+
+def create_schema(path: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from sqlalchemy import create_engine
+    from app.core.database import Base
+    from app.core.migrations import run_migrations
+    import app.models.demand, app.models.latest_price, app.models.price, app.models.price_cursor  # noqa: F401
+    import app.models.reporter, app.models.station, app.models.user  # noqa: F401
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        run_migrations(conn)
+    engine.dispose()
+
+
+def seed(path: str, stations: int, history: int, stale_fraction: float = 0.1, seed: int = 1):
+    """Create `path` with `stations` stations and `history` reports of every tag per station."""
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    create_schema(path)
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    stamp = now.isoformat(" ")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    station_rows = [
+        (s["_id"], s["name"], s["chain"], s["brand"], s["address"]["street"], s["address"]["city"],
+         s["address"]["zipcode"], s["address"]["country"], s["location"]["coordinates"][1],
+         s["location"]["coordinates"][0], True, stamp)
+        for s in make_stations(stations, seed)
+    ]
+    conn.executemany(
+        "INSERT INTO stations (id, name, chain, brand, address_street, address_city, address_zipcode, "
+        "address_country, location_latitude, location_longitude, is_visible, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        station_rows
+    )
+
+    prices, latest, cursors = [], [], []
+    for station in station_rows:
+        station_id = station[0]
+        values = {tag: rng.uniform(1.6, 2.2) for tag in TAGS}
+        timestamp = None
+        for i in range(history):
+            timestamp = (now - timedelta(hours=6 * (history - i))).replace(microsecond=0).isoformat() + ".000Z"
+            for tag in TAGS:
+                delta = round(rng.uniform(-0.05, 0.05), 3)
+                values[tag] = round(values[tag] + delta, 3)
+                prices.append((station_id, tag, values[tag], timestamp, delta, "bench", stamp))
+        if timestamp:
+            latest.extend((station_id, tag, values[tag], timestamp, stamp) for tag in TAGS)
+        if rng.random() >= stale_fraction:
+            cursors.append((station_id, timestamp, stamp))
+        if len(prices) >= BATCH:
+            conn.executemany(
+                "INSERT INTO prices (station_id, tag, price, updated, delta, reporter, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                prices
+            )
+            prices = []
+    conn.executemany(
+        "INSERT INTO prices (station_id, tag, price, updated, delta, reporter, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        prices
+    )
+    conn.executemany("INSERT INTO latest_prices (station_id, tag, price, updated, updated_at) VALUES (?, ?, ?, ?, ?)", latest)
+    conn.executemany("INSERT INTO price_cursors (station_id, since, checked_at) VALUES (?, ?, ?)", cursors)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"Seeded {path}: {stations} stations, {stations * history * len(TAGS)} prices in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="bench/data/bench.db")
+    parser.add_argument("--stations", type=int, default=10000)
+    parser.add_argument("--history", type=int, default=40)
+    parser.add_argument("--stale-fraction", type=float, default=0.1)
+    args = parser.parse_args()
+    seed(args.db, args.stations, args.history, args.stale_fraction)
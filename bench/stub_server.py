@@ -0,0 +1,102 @@
+"""Fake api.tankille.fi for benchmarks and local runs.
+
+    python -m bench.stub_server --port 8081 --stations 20000 --history 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+from aiohttp import web
+
+CHAINS = ["Neste", "St1", "ABC", "Shell", "Teboil", "SEO"]
+CITIES = ["Helsinki", "Espoo", "Tampere", "Vantaa", "Oulu", "Turku", "Jyväskylä", "Lahti", "Kuopio", "Pori"]
+TAGS = ["95", "98", "dsl"]
+
+
+def make_stations(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    stations = []
+    for i in range(count):
+        chain = rng.choice(CHAINS)
+        stations.append({
+            "_id": f"station{i:06d}",
+            "name": f"{chain} {i}",
+            "chain": chain,
+            "brand": chain,
+            "address": {
+                "street": f"Katu {i}",
+                "city": rng.choice(CITIES),
+                "zipcode": f"{rng.randint(0, 99999):05d}",
+                "country": "Finland"
+            },
+            "location": {"coordinates": [rng.uniform(20.5, 31.5), rng.uniform(59.8, 70.0)]},
+            "isVisible": 1
+        })
+    return stations
+
+
+def make_prices(station_id: str, history: int, since: str = None):
+    rng = random.Random(station_id)
+    now = datetime.utcnow().replace(microsecond=0)
+    reports = []
+    for i in range(history):
+        timestamp = (now - timedelta(hours=6 * (history - i))).isoformat() + ".000Z"
+        if since and timestamp <= since:
+            continue
+        reports.append({
+            "timestamp": timestamp,
+            "userId": f"user{rng.randint(1, 500)}",
+            "prices": [{"tag": tag, "value": round(rng.uniform(1.6, 2.2), 3)} for tag in TAGS]
+        })
+    return reports
+
+
+def create_app(stations: int, history: int, latency: float, failure_rate: float = 0.0):
+    station_list = make_stations(stations)
+
+    async def delay():
+        if latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * latency)
+        if failure_rate and random.random() < failure_rate:
+            raise web.HTTPServiceUnavailable()
+
+    async def login(request):
+        await delay()
+        return web.json_response({"refreshToken": "stub-refresh"})
+
+    async def refresh(request):
+        await delay()
+        return web.json_response({"accessToken": "stub-access", "refreshToken": "stub-refresh"})
+
+    async def get_stations(request):
+        await delay()
+        return web.json_response(station_list)
+
+    async def get_prices(request):
+        await delay()
+        return web.json_response(make_prices(request.match_info["station_id"], history, request.query.get("since")))
+
+    app = web.Application()
+    app.router.add_post("/auth/login", login)
+    app.router.add_post("/auth/refresh", refresh)
+    app.router.add_get("/stations", get_stations)
+    app.router.add_get("/stations/{station_id}/prices", get_prices)
+    return app
+
+
+async def start(port: int, stations: int, history: int, latency: float, failure_rate: float = 0.0):
+    runner = web.AppRunner(create_app(stations, history, latency, failure_rate))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.stations, args.history, args.latency, args.failure_rate), host="127.0.0.1", port=args.port)
@@ -1,7 +1,21 @@
 import multiprocessing
+import os
+import shutil
 
 workers = multiprocessing.cpu_count() * 2 + 1
 threads = 4
 timeout = 360
 bind = "0.0.0.0:5269"
 worker_class = "uvicorn.workers.UvicornWorker"
+
+# Workers write metrics here so /metrics can aggregate across processes
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/tankrest-metrics")
+
+def on_starting(server):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,16 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
 from loguru import logger
 from app.api import endpoints
-from app.core.database import Base, engine, get_async_db
-from app.services.auth import AuthService
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.database import Base, detect_features, engine, get_async_db
+from app.core.http import http_client
+from app.core.locks import FileLease, is_leader, leader_lease
+from app.core.logging import configure_logging
+from app.core.metrics import RequestMetricsMiddleware, render as render_metrics
+from app.core.migrations import run_migrations, tables_exist
+from app.core.startup import startup
 from app.services.fuel import FuelService
+from app.services.prices import PriceService
+from app.services.ingestion import demand_tracker, ingestion_scheduler
 from app.models.station import Station
-from pathlib import Path
+from app.services.retention import RetentionService
+from app.services.snapshot import StationSnapshot, station_snapshot
+from app.services.spatial import station_index
+from app.services.stations import StationService
+from app.services.tokens import token_manager
+from datetime import datetime, timedelta
 import aiofiles
 import asyncio
 import uvicorn
@@ -18,127 +32,153 @@ import uvicorn
 app = FastAPI()
 
 # Configure logging
-logger.add("app.log", rotation="500 MB")
+configure_logging()
 
 # Disable default Gunicorn error logging
 import logging
 gunicorn_error_logger = logging.getLogger("gunicorn.error")
 gunicorn_error_logger.handlers = []
 
-# Create the database tables
-@app.on_event("startup")
-async def startup_event():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-tokens = None
-tokens_lock = asyncio.Lock()
-
-class FileLockContextManager:
-    """Create a file on enter and remove that file on exit."""
-
-    def __init__(self, filename) -> None:
-        self.filename = filename
-        self.lock_file = Path(self.filename)
-
-    async def __aenter__(self) -> None:
-        async with aiofiles.open(self.lock_file, mode='x'):
-            pass
+app.add_middleware(RequestMetricsMiddleware)
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        logger.warning("Deleting lock file")
-        await aiofiles.os.remove(self.lock_file)
+async def setup_schema():
+    """Create and migrate the schema on the leader only.
 
-async def initialize_tokens():
-    global tokens
-    try:
-        login_response = await AuthService.login()
-        logger.info("Successfully logged in and obtained tokens.")
-        logger.info(f"Login response: {login_response}")
-        refresh_token = login_response.get("refreshToken")
-        tokens = await AuthService.refresh(refresh_token)
-        logger.info("Successfully refreshed token.")
-        logger.info(f"Tokens received: {tokens}")
-        endpoints.set_tokens(tokens)
-    except Exception as e:
-        logger.error(f"Failed to login or refresh token: {e}")
-        tokens = None
-
-async def refresh_tokens_periodically():
-    global tokens
+    Other workers serve as soon as the tables exist; on a fresh database
+    they wait for whichever process holds the schema lease.
+    """
+    lease = FileLease("schema")
+    leader = is_leader()
     while True:
-        await asyncio.sleep(3600)  # Refresh every hour
+        if not leader:
+            async with engine.connect() as conn:
+                if await conn.run_sync(tables_exist):
+                    break
+        if lease.acquire():
+            try:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    await conn.run_sync(run_migrations)
+            finally:
+                lease.release()
+            break
+        await lease.wait_released(settings.LOCK_WAIT_TIMEOUT)
+    async with engine.connect() as conn:
+        await conn.run_sync(detect_features)
+
+# Create the database tables and the shared upstream HTTP client
+@app.on_event("startup")
+async def startup_event():
+    with startup.phase("http_client"):
+        await http_client.start()
+    with startup.phase("schema"):
+        await setup_schema()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.close()
+
+async def invalidate_cache_periodically():
+    """Drop cached responses for stations whose prices other workers updated."""
+    since = datetime.utcnow()
+    while True:
+        await asyncio.sleep(settings.CACHE_INVALIDATION_INTERVAL)
         try:
-            async with FileLockContextManager("/tmp/token_refresh.lock"):
-                async with tokens_lock:
-                    refresh_token = tokens.get("refreshToken")
-                    tokens = await AuthService.refresh(refresh_token)
-                    logger.info("Token refresh successful")
-                    endpoints.set_tokens(tokens)
-        except FileExistsError:
-            logger.info("Token refresh already in progress by another worker.")
+            checked = datetime.utcnow()
+            async with get_async_db() as db:
+                changed = await PriceService.changed_since(db, since)
+            response_cache.invalidate_stations(changed)
+            # Overlap windows so writes committed during the check are not missed
+            since = checked - timedelta(seconds=settings.CACHE_INVALIDATION_INTERVAL)
         except Exception as e:
-            logger.error(f"Failed to refresh tokens: {e}")
+            logger.error(f"Failed to check for price changes: {e}")
 
-# Initialize tokens on startup
+# Start background work; tokens and stations warm up without blocking startup
 @app.on_event("startup")
 async def on_startup():
-    await initialize_tokens()
-    asyncio.create_task(refresh_tokens_periodically())
-
-async def update_stations(db: AsyncSession, token: str):
-    stations_data = await FuelService.get_stations(token)
-    for station in stations_data:
-        result = await db.execute(select(Station).where(Station.id == station["_id"]))
-        db_station = result.scalar_one_or_none()
-
-        if not db_station:
-            try:
-                is_visible = station.get("isVisible", False)
-                if isinstance(is_visible, int):
-                    is_visible = bool(is_visible)
-
-                location_latitude = float(station["location"]["coordinates"][1])
-                location_longitude = float(station["location"]["coordinates"][0])
-
-                logger.info(f"Adding station: id={station['_id']}, name={station['name']}")
-
-                db_station = Station(
-                    id=station["_id"],
-                    name=station["name"],
-                    chain=station["chain"],
-                    brand=station["brand"],
-                    address_street=station["address"]["street"],
-                    address_city=station["address"]["city"],
-                    address_zipcode=station["address"]["zipcode"],
-                    address_country=station["address"]["country"],
-                    location_latitude=location_latitude,
-                    location_longitude=location_longitude,
-                    is_visible=is_visible
-                )
-                db.add(db_station)
-            except Exception as e:
-                logger.error(f"Error adding station {station['_id']}: {e}")
-    await db.commit()
-
-@app.on_event("startup")
-async def initial_update_stations():
-    async with tokens_lock:
-        if tokens and "accessToken" in tokens:
-            async with get_async_db() as db:
-                try:
-                    await update_stations(db, tokens["accessToken"])
-                except SQLAlchemyError as e:
-                    logger.error(f"Database error during initial update: {e}")
-                except Exception as e:
-                    logger.error(f"Unexpected error during initial update: {e}")
+    asyncio.create_task(warm_up())
+    asyncio.create_task(token_manager.refresh_periodically())
+    if settings.CACHE_ENABLED:
+        asyncio.create_task(invalidate_cache_periodically())
+    if settings.INGESTION_ENABLED:
+        asyncio.create_task(demand_tracker.flush_periodically())
+        asyncio.create_task(ingestion_scheduler.run())
+    if settings.RETENTION_ENABLED:
+        asyncio.create_task(RetentionService.run_periodically())
+
+async def update_stations(db: AsyncSession):
+    stations_data = await token_manager.call(FuelService.get_stations)
+    await StationService.sync(db, stations_data)
+    response_cache.clear()
+    if is_leader():
+        await StationSnapshot.build(db, settings.SNAPSHOT_PATH)
+    await rebuild_station_index(db)
+
+async def rebuild_station_index(db: AsyncSession):
+    # Searches query the mapped snapshot directly, so no private index is needed
+    station_snapshot.refresh(interval=0)
+    if station_snapshot.ready:
+        return
+    result = await db.execute(select(Station.id, Station.location_latitude, Station.location_longitude))
+    station_index.rebuild(result.all())
+    logger.info(f"Spatial index rebuilt with {station_index.size} stations")
+
+async def warm_up():
+    """Load tokens and the station index from the database, then (leader only) sync stations.
+
+    The worker is warm once it can serve from the existing database; the
+    upstream station sync runs afterwards.
+    """
+    leader = is_leader()
+    try:
+        with startup.phase("tokens"):
+            await token_manager.get_access_token()
+        async with get_async_db() as db:
+            station_snapshot.refresh(interval=0)
+            if leader and not station_snapshot.ready:
+                with startup.phase("snapshot"):
+                    await StationSnapshot.build(db, settings.SNAPSHOT_PATH)
+            with startup.phase("station_index"):
+                await rebuild_station_index(db)
+        startup.mark_warm()
+        if not leader:
+            logger.info("Not the leader, serving stations from the database without an upstream sync")
+        elif not token_manager.access_token:
+            logger.error("No access token available, serving stations from the database.")
         else:
-            logger.error("No accessToken found in tokens.")
+            with startup.phase("station_sync"):
+                async with get_async_db() as db:
+                    await update_stations(db)
+    except SQLAlchemyError as e:
+        logger.error(f"Database error during warm-up: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error during warm-up: {e}")
 
 app.include_router(endpoints.router)
 
 app.mount("/static", StaticFiles(directory="app/templates"), name="static")
 
+@app.get("/healthz")
+async def read_health():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def read_readiness():
+    """503 until warm-up finished and stations are loaded (on a fresh database, after the leader's sync)."""
+    status = startup.status()
+    station_snapshot.refresh()
+    status["ready"] = startup.warm and (station_snapshot.ready or station_index.ready)
+    status["leader"] = leader_lease.fd is not None
+    status["token"] = bool(token_manager.access_token)
+    status["snapshot_version"] = station_snapshot.version or None
+    status["upstream_circuits"] = http_client.breaker_states()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def read_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_index():
     async with aiofiles.open("app/templates/index.html") as f: